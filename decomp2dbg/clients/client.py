@@ -11,6 +11,11 @@ def only_if_connected(f):
     return _only_if_connected
 
 
+def _int_keys(addr_dict):
+    # xmlrpc can only send string keys, so parse the addresses once when they arrive
+    return {int(addr, 0): val for addr, val in addr_dict.items()}
+
+
 class DecompilerClient:
     def __init__(self, name="decompiler", host="localhost", port=3662, native_sym_support=True):
         self.name = name
@@ -88,12 +93,12 @@ class DecompilerClient:
     @property
     @only_if_connected
     def function_headers(self):
-        return self.server.function_headers()
+        return _int_keys(self.server.function_headers())
 
     @property
     @only_if_connected
     def global_vars(self):
-        return self.server.global_vars()
+        return _int_keys(self.server.global_vars())
 
     @property
     @only_if_connected
@@ -1,7 +1,7 @@
 import textwrap
 import argparse
-import contextlib
-import io
+import bisect
+from functools import cached_property
 
 import gdb
 
@@ -11,6 +11,18 @@ from .utils import *
 from .symbol_mapper import SymbolMapper
 from .decompiler_pane import DecompilerPane
 
+# matches decompiler-specific types like __int64 (optionally an array) and the unsigned keyword
+_TYPE_RE = re.compile(r"__(\w+)(\[[^\]]*\])?|unsigned ")
+_SYM_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+# gdb expression templates used for every variable on each stop
+_REG_EXPR = "((%s) ($%s))"
+_REG_VAL_EXPR = "$%s"
+_STACK_EXPR = "(%s*) (%s - %d)"
+_STACK_FALLBACK_EXPR = "($fp - %d)"
+_SIZEOF_EXPR = "sizeof(%s)"
+_SET_CMD = "set $%s = %s"
+
 #
 # Decompiler Client Interface
 #
@@ -21,20 +33,26 @@ class GDBDecompilerClient(DecompilerClient):
         super(GDBDecompilerClient, self).__init__(name=name, host=host, port=port)
         self.gdb_client: "GDBClient" = gdb_client
         self.symbol_mapper = SymbolMapper()
-        self._is_pie = None
         self._lvar_bptr = None
-
-    @property
-    @lru_cache()
+        self._installed_syms = set()
+        # convenience var name -> (func_addr, reg_name, type_str, reg_val) it was last set from
+        self._var_set_cache = {}
+        # sorted function ranges for finding the function containing the pc
+        self._func_headers = {}
+        self._func_starts = []
+        self._func_ends = []
+        self._last_func_bounds = (0, 0)
+        self._last_stack_frame = None
+        # cleaned type strs gdb is known to understand
+        self._known_types = set()
+
+    @cached_property
     def text_base_addr(self):
         return self.gdb_client.base_addr_start
 
     @property
     def is_pie(self):
-        if self._is_pie is None:
-            self._is_pie = self.gdb_client.is_pie
-
-        return self._is_pie
+        return self.gdb_client.is_pie
 
     def rebase_addr(self, addr, up=False):
         corrected_addr = addr
@@ -50,35 +68,55 @@ class GDBDecompilerClient(DecompilerClient):
         self.gdb_client.on_decompiler_connected(self.name)
 
     def decompiler_disconnected(self):
+        self._installed_syms = set()
+        self._var_set_cache = {}
+        self._func_headers = {}
+        self._func_starts = []
+        self._func_ends = []
+        self._last_func_bounds = (0, 0)
+        self._last_stack_frame = None
+        self._known_types = set()
+        # the base is rediscovered on the next connection
+        self.__dict__.pop("text_base_addr", None)
         self.gdb_client.on_decompiler_disconnected(self.name)
 
     def update_symbols(self):
         self.symbol_mapper.text_base_addr = self.text_base_addr
 
         global_vars, func_headers = self.update_global_vars(), self.update_function_headers()
-        syms_to_add = []
-        sym_name_set = set()
         global_var_size = 8
+        if func_headers != self._func_headers:
+            self._rebuild_index(func_headers)
 
         if not self.native_sym_support:
             err("Native symbol support is required to run decomp2dbg, assure you have coreutils installed.")
             return False
 
         # add symbols with native support if possible
-        for addr, func in func_headers.items():
-            syms_to_add.append((func["name"], int(addr, 0), "function", func["size"]))
-            sym_name_set.add(func["name"])
-
-        for addr, global_var in global_vars.items():
-            clean_name = re.sub(r"[^a-zA-Z0-9_]", "_", global_var['name'])
-            # never re-add globals with the same name as a func
-            if clean_name in sym_name_set:
-                continue
-
-            syms_to_add.append((clean_name, int(addr, 0), "object", global_var_size))
+        func_syms = {(func["name"], addr, "function", func["size"]) for addr, func in func_headers.items()}
+        func_names = {func["name"] for func in func_headers.values()}
+        clean_globals = ((_SYM_NAME_RE.sub("_", gvar["name"]), addr) for addr, gvar in global_vars.items())
+        # never re-add globals with the same name as a func
+        global_syms = {
+            (name, addr, "object", global_var_size) for name, addr in clean_globals if name not in func_names
+        }
+
+        # only install symbols that changed since the last update
+        new_syms = func_syms | global_syms
+        to_add = new_syms - self._installed_syms
+        to_remove = self._installed_syms - new_syms
+        if not to_add and not to_remove:
+            return True
 
         try:
-            self.symbol_mapper.add_native_symbols(syms_to_add)
+            # gdb can only drop whole symbol files, so any removal (or a fresh connection) forces a full reload
+            if to_remove or not self._installed_syms:
+                self.symbol_mapper.remove_native_symbols()
+                self._installed_syms = set()
+                to_add = new_syms
+
+            if self.symbol_mapper.add_native_symbols(to_add):
+                self._installed_syms = new_syms
         except Exception as e:
             err(f"Failed to set symbols natively: {e}")
             self.native_sym_support = False
@@ -92,17 +130,23 @@ class GDBDecompilerClient(DecompilerClient):
     def update_function_headers(self):
         return self.function_headers
 
-    def _clean_type_str(self, type_str):
-        if "__" in type_str:
-            type_str = type_str.replace("__", "")
-            idx = type_str.find("[")
-            if idx != -1:
-                type_str = type_str[:idx] + "_t" + type_str[idx:]
-            else:
-                type_str += "_t"
-        type_str = type_str.replace("unsigned ", "u")
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _clean_type_str(type_str):
+        # most types are already plain C, so skip the rewrite entirely
+        if "__" not in type_str and "unsigned " not in type_str:
+            return type_str
+
+        return _TYPE_RE.sub(GDBDecompilerClient._clean_type_repl, type_str)
 
-        return type_str
+    @staticmethod
+    def _clean_type_repl(match):
+        if match.group(1) is None:
+            # unsigned int -> uint
+            return "u"
+
+        # __int64[4] -> int64_t[4]
+        return f"{match.group(1)}_t{match.group(2) or ''}"
 
     def _find_local_var_base_ptr(self):
         if self._lvar_bptr is not None:
@@ -126,72 +170,171 @@ class GDBDecompilerClient(DecompilerClient):
             return self._lvar_bptr
 
 
+    def _rebuild_index(self, func_headers):
+        ranges = sorted((addr, addr + func["size"]) for addr, func in func_headers.items())
+        self._func_headers = func_headers
+        self._func_starts = [start for start, _ in ranges]
+        self._func_ends = [end for _, end in ranges]
+        self._last_func_bounds = (0, 0)
+
+    def _find_func_bounds(self, addr):
+        idx = bisect.bisect_right(self._func_starts, addr) - 1
+        if idx >= 0 and addr < self._func_ends[idx]:
+            return self._func_starts[idx], self._func_ends[idx]
+
+        # unknown function, treat the addr as its own function
+        return addr, addr + 1
+
+    def _is_known_type(self, type_str):
+        if type_str in self._known_types:
+            return True
+
+        # unknown types are not cached, gdb may learn them later from new objfiles
+        try:
+            gdb.parse_and_eval(_SIZEOF_EXPR % type_str)
+        except gdb.error:
+            return False
+
+        self._known_types.add(type_str)
+        return True
+
     def update_function_data(self, addr):
         func_data = self.function_data(addr)
         reg_vars = func_data.get("reg_vars", {})
         stack_vars = func_data.get("stack_vars", {})
 
+        lo, hi = self._last_func_bounds
+        if not lo <= addr < hi:
+            self._last_func_bounds = self._find_func_bounds(addr)
+        func_addr = self._last_func_bounds[0]
+
+        # (var name, typed command, untyped fallback) triples, executed together at the end
+        set_cmds = []
         for name, var in reg_vars.items():
             type_str = self._clean_type_str(var['type'])
             reg_name = var['reg_name']
-            expr = f"""(({type_str}) (${reg_name})"""
+            fallback_cmd = _SET_CMD % (name, _REG_VAL_EXPR % reg_name)
 
+            # skip vars whose register still holds the value we last set them from
             try:
-                val = gdb.parse_and_eval(expr)
-                gdb.execute(f"set ${name} = {val}")
-                type_unknown = False
-            except Exception:
-                type_unknown = True
+                reg_val = int(gdb.parse_and_eval(_REG_VAL_EXPR % reg_name))
+            except gdb.error:
+                reg_val = None
 
-            if type_unknown:
-                try:
-                    gdb.execute(f"set ${name} = (${reg_name})")
-                except Exception:
-                    continue
+            cache_key = (func_addr, reg_name, type_str, reg_val)
+            if reg_val is not None and self._var_set_cache.get(name) == cache_key:
+                continue
+            self._var_set_cache[name] = cache_key
+
+            # types gdb does not know go straight to the untyped set
+            if not self._is_known_type(type_str):
+                set_cmds.append((name, fallback_cmd, None))
+                continue
+
+            set_cmds.append((name, _SET_CMD % (name, _REG_EXPR % (type_str, reg_name)), fallback_cmd))
+
+        # stack vars only move when we enter a new frame or the decompiler changes them
+        lvar_bptr = self._find_local_var_base_ptr()
+        bptr_val = None
+        if lvar_bptr is not None:
+            try:
+                bptr_val = int(gdb.parse_and_eval(lvar_bptr))
+            except gdb.error:
+                pass
+
+        stack_frame = (func_addr, bptr_val, stack_vars)
+        if bptr_val is not None and self._last_stack_frame == stack_frame:
+            stack_vars = {}
+        self._last_stack_frame = stack_frame
 
         for offset, stack_var in stack_vars.items():
             offset = abs(int(offset, 0))
             type_str = self._clean_type_str(stack_var['type'])
-            lvar_bptr = self._find_local_var_base_ptr()
             if lvar_bptr == "$rbp":
                 offset -= 8
             elif lvar_bptr == "$ebp":
                 offset -= 4
 
-            expr = f"""({type_str}*) ({lvar_bptr} - {offset})"""
             var_name = stack_var['name']
+            self._var_set_cache.pop(var_name, None)
+            fallback_cmd = _SET_CMD % (var_name, _STACK_FALLBACK_EXPR % offset)
+            if not self._is_known_type(type_str):
+                set_cmds.append((var_name, fallback_cmd, None))
+                continue
 
-            try:
-                gdb.execute(f"set ${var_name} = " + expr)
-                type_unknown = False
-            except Exception:
-                type_unknown = True
+            set_cmds.append((var_name, _SET_CMD % (var_name, _STACK_EXPR % (type_str, lvar_bptr, offset)), fallback_cmd))
+
+        # forget only the vars that could not be set at all, so they are retried on the next stop
+        stack_var_names = {stack_var['name'] for stack_var in stack_vars.values()}
+        for name in self._execute_set_cmds(set_cmds):
+            self._var_set_cache.pop(name, None)
+            if name in stack_var_names:
+                self._last_stack_frame = None
+
+    @staticmethod
+    def _execute_set_cmds(set_cmds):
+        """
+        Runs every set command as one gdb command, replaying them one-by-one with their fallbacks only if
+        something in the batch failed. Returns the names of the vars that could not be set.
+        """
+        failed = []
+        if not set_cmds:
+            return failed
 
-            if type_unknown:
-                try:
-                    gdb.execute(f"set ${var_name} = ($fp - {offset})")
-                except Exception:
+        try:
+            gdb.execute("\n".join(cmd for _, cmd, _ in set_cmds))
+            return failed
+        except gdb.error:
+            pass
+
+        for name, cmd, fallback_cmd in set_cmds:
+            try:
+                gdb.execute(cmd)
+                continue
+            except gdb.error:
+                if fallback_cmd is None:
+                    failed.append(name)
                     continue
 
+            try:
+                gdb.execute(fallback_cmd)
+            except gdb.error:
+                failed.append(name)
+
+        return failed
+
 
 #
 # Command Interface
 #
 
+class _CommandArgParser(argparse.ArgumentParser):
+    def error(self, message):
+        # raise into the command's error handler instead of printing usage and exiting gdb's command
+        raise ValueError(message)
+
+
 class DecompilerCommand(gdb.Command):
     def __init__(self, decompiler, gdb_client):
         super(DecompilerCommand, self).__init__("decompiler", gdb.COMMAND_USER)
         self.decompiler = decompiler
         self.gdb_client = gdb_client
-        self.arg_parser = self._init_arg_parser()
+        self._handlers = {
+            "connect": self._handle_connect,
+            "disconnect": self._handle_disconnect,
+            "info": self._handle_info,
+        }
+
+    @property
+    def arg_parser(self):
+        # built on first use so loading the plugin stays cheap
+        return self._init_arg_parser()
 
     @only_if_gdb_running
     def invoke(self, arg, from_tty):
         raw_args = arg.split()
         try:
-            f = io.StringIO()
-            with contextlib.redirect_stderr(f):
-                args = self.arg_parser.parse_args(raw_args)
+            args = self.arg_parser.parse_args(raw_args)
         except (RuntimeError, RuntimeWarning):
             return
         except Exception as e:
@@ -202,8 +345,9 @@ class DecompilerCommand(gdb.Command):
         self._handle_cmd(args)
 
     @staticmethod
+    @lru_cache(maxsize=1)
     def _init_arg_parser():
-        parser = argparse.ArgumentParser()
+        parser = _CommandArgParser()
         commands = ["connect", "disconnect", "info"]
         parser.add_argument(
             'command', type=str, choices=commands, help="""
@@ -236,10 +380,8 @@ class DecompilerCommand(gdb.Command):
         return parser
 
     def _handle_cmd(self, args):
-        cmd = args.command
-        handler_str = f"_handle_{cmd}"
-        handler = getattr(self, handler_str)
-        handler(args)
+        # the arg parser already restricts the command to known choices
+        self._handlers[args.command](args)
 
     def _handle_connect(self, args):
         if not args.decompiler_name:
@@ -310,10 +452,9 @@ class GDBClient:
     def find_text_segment_base_addr(self, is_remote=False):
         return find_text_segment_base_addr(is_remote=is_remote)
 
-    @property
+    @cached_property
     def is_pie(self):
-        checksec_status = checksec(get_filepath())
-        return checksec_status["PIE"]  # if pie we will have offset instead of abs address.
+        return elf_is_pie(get_filepath())  # if pie we will have offset instead of abs address.
 
     #
     # Event Handlers
@@ -327,6 +468,8 @@ class GDBClient:
 
     def on_decompiler_disconnected(self, decompiler_name):
         self.deregister_decompiler_context_pane(decompiler_name)
+        # a different binary may be debugged on the next connection
+        self.__dict__.pop("is_pie", None)
         self.name = None
         self.base_addr_start = None
         self.base_addr_end = None
@@ -1,5 +1,7 @@
+from functools import cached_property
+
 from .gdb_client import GDBClient
-from .utils import is_remote_debug, checksec
+from .utils import is_remote_debug, elf_is_pie
 
 
 class GEFClient(GDBClient):
@@ -29,8 +31,7 @@ class GEFClient(GDBClient):
 
         return base_address
     
-    @property
+    @cached_property
     def is_pie(self):
         elf_file = self.gef_ref.session.remote.lfile if is_remote_debug() else self.gef_ref.session.file
-        checksec_status = checksec(str(elf_file))
-        return checksec_status["PIE"]  # if pie we will have offset instead of abs address.
+        return elf_is_pie(str(elf_file))  # if pie we will have offset instead of abs address.
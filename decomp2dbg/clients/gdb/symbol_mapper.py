@@ -47,9 +47,9 @@ class SymbolMapper:
         Adding symbols to GDB is non-trivial, it requires the use of an entire object file. Because of its
         difficulty, this is currently only supported on ELFs. When adding a symbol, we use two binutils,
         gcc and objcopy. After making a small ELF, we strip it of everything but needed sections. We then
-        use objcopy to one-by-one add a symbol to the file. Objcopy does not support sizing, so we do a byte
-        patch on the binary to allow for a real size. Finally, the whole object is read in with the default
-        gdb command: add-symbol-file.
+        use a single objcopy run, fed by a response file, to add every symbol to the file. Objcopy does not
+        support sizing, so we do a byte patch on the binary to allow for a real size. Finally, the whole object
+        is read in with a single default gdb command: add-symbol-file.
         """
 
         if not self.check_native_symbol_support():
@@ -62,22 +62,19 @@ class SymbolMapper:
             return False
 
         # info("{:d} symbols will be added".format(len(sym_info_list)))
-        self._delete_old_sym_files()
 
-        # add each symbol into a mass symbol commit
-        max_commit_size = 1500
+        # add every symbol into a single mass symbol commit
         supported_types = ["function", "object"]
 
         objcopy_cmds = []
         queued_sym_sizes = {}
-        fname = self._construct_small_elf()
-        for i, (name, addr, typ, size) in enumerate(sym_info_list):
+        for name, addr, typ, size in sym_info_list:
             if typ not in supported_types:
                 warn(f"Skipping symbol {name}, type is not supported: {typ}")
                 continue
 
             # queue the sym for later use
-            queued_sym_sizes[i % max_commit_size] = size
+            queued_sym_sizes[len(objcopy_cmds)] = size
 
             # absolute addressing
             #if addr >= self.text_base_addr:
@@ -94,26 +91,24 @@ class SymbolMapper:
             # create a symbol command for the symbol
             objcopy_cmds.append(
                 '--add-symbol {name}={addr_str},global,{type_flag}'.format(
-                    name=name, addr_str=addr_str, type_flag=typ
+                    name=shlex.quote(name), addr_str=addr_str, type_flag=typ
                 )
             )
 
-            # batch commit
-            if i > 1 and i % max_commit_size == 0:
-                # add the queued symbols
-                self._add_symbol_file(fname, objcopy_cmds, self.text_base_addr, queued_sym_sizes)
-
-                # re-init queues and elf
-                fname = self._construct_small_elf()
-                objcopy_cmds = []
-                queued_sym_sizes = {}
-
-        # commit remaining symbol commands
+        # commit all symbol commands at once
         if objcopy_cmds:
+            fname = self._construct_small_elf()
             self._add_symbol_file(fname, objcopy_cmds, self.text_base_addr, queued_sym_sizes)
 
         return True
 
+    def remove_native_symbols(self):
+        """
+        Removes every symbol previously added with add_native_symbols. GDB can only drop whole symbol
+        files, so individual symbols can not be removed.
+        """
+        self._delete_old_sym_files()
+
     def check_native_symbol_support(self):
         # validate binutils bins exist
         try:
@@ -244,9 +239,12 @@ class SymbolMapper:
         open(fname, "wb").write(elf_data)
 
     def _add_symbol_file(self, fname, cmd_string_arr, text_base, queued_sym_sizes):
-        # add the symbols through copying
-        cmd_string = ' '.join(cmd_string_arr)
-        os.system(f"{self._objcopy} {cmd_string} {fname}")
+        # add the symbols through copying, using a response file to avoid command line length limits
+        fd, rsp_fname = tempfile.mkstemp(dir="/tmp", suffix=".rsp")
+        with os.fdopen(fd, "w") as fp:
+            fp.write('\n'.join(cmd_string_arr))
+        os.system(f"{self._objcopy} @{rsp_fname} {fname}")
+        os.unlink(rsp_fname)
 
         # force update the size of each symbol
         self._force_update_sym_sizes(fname, queued_sym_sizes)
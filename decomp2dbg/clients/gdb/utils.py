@@ -169,6 +169,18 @@ def checksec(filename: str) -> Dict[str, bool]:
 
 
 
+def elf_is_pie(filename: str) -> bool:
+    """Return True if the ELF binary is position independent, read straight from the e_type
+    field of its header instead of going through readelf like checksec()."""
+    with open(filename, "rb") as fp:
+        header = fp.read(18)
+
+    # EI_DATA decides the endianness of every field after e_ident
+    byte_order = "big" if header[5] == 2 else "little"
+    e_type = int.from_bytes(header[16:18], byte_order)
+    return e_type == 3  # ET_DYN
+
+
 @lru_cache()
 def is_remote_debug() -> bool:
     """"Return True is the current debugging session is running through GDB remote session."""